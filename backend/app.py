@@ -1,16 +1,30 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from typing import List
-from utils.coordinate_converter import process_coordinates
+from typing import List, Optional
+from utils.coordinate_converter import (
+    process_coordinates, project_coordinate_columns, utm_columns_to_rows,
+    CoordinateValidationError
+)
 import os
 import tempfile
 import json
+import asyncio
 from models.certificate import Certificate, CertificateCreate, CertificateUpdate
 from utils.database import Database, DATABASE_NAME
+from utils.events import EventHub
+from utils.cache import (
+    certificate_key, list_key, lookup, read_generation, fill,
+    invalidate_certificate, validators_for, conditional_headers, is_not_modified
+)
+from utils.revisions import (
+    RevisionNotFoundError, ensure_revision_baseline, record_revision, list_revisions,
+    get_revision, diff_revisions, delete_revisions
+)
 from datetime import datetime, timezone, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
 from pydantic import ValidationError
 
 app = FastAPI()
@@ -40,6 +54,47 @@ class Coordinate(BaseModel):
 class CoordinateRequest(BaseModel):
     coordinates: List[Coordinate]
 
+class CoordinateColumnsRequest(BaseModel):
+    """Parallel coordinate arrays, either in DMS form or as decimal degrees"""
+    lat_deg: Optional[List[float]] = None
+    lat_min: Optional[List[float]] = None
+    lat_sec: Optional[List[float]] = None
+    lat_dir: Optional[List[str]] = None
+    lon_deg: Optional[List[float]] = None
+    lon_min: Optional[List[float]] = None
+    lon_sec: Optional[List[float]] = None
+    lon_dir: Optional[List[str]] = None
+    lat: Optional[List[float]] = None
+    lon: Optional[List[float]] = None
+    amsl: List[float]
+
+def dxf_response(utm_coordinates, include_values=True):
+    """Generate a DXF file for the given UTM coordinates and wrap it in a download response
+
+    ``include_values`` adds the converted values as the X-Converted-Values header,
+    which only suits small boundaries.
+    """
+    # Create a temporary directory
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Generate DXF file
+        output_path = os.path.join(temp_dir, "coordinates.dxf")
+        from utils.dxf_generator import create_dxf
+        create_dxf(utm_coordinates, output_path)
+        
+        # Read the file content
+        with open(output_path, 'rb') as f:
+            file_content = f.read()
+        
+        print("\n=== DXF Generation Successful ===")
+        print(f"File size: {len(file_content)} bytes")
+        
+        # Return the file
+        headers = {"Content-Disposition": "attachment; filename=coordinates.dxf"}
+        if include_values:
+            headers["X-Converted-Values"] = json.dumps(utm_coordinates)
+            headers["Access-Control-Expose-Headers"] = "X-Converted-Values"
+        return Response(content=file_content, media_type="application/dxf", headers=headers)
+
 @app.options("/api/convert")
 async def options_convert():
     return {"status": "ok"}
@@ -55,6 +110,7 @@ async def startup_db_client():
         print(f"Successfully connected to database: {DATABASE_NAME}")
         print(f"Available collections: {collections}")
         print("=== Database Connection Successful ===\n")
+        await EventHub.start_change_stream(db, format_certificate)
     except Exception as e:
         print(f"\n=== Database Connection Failed ===")
         print(f"Error: {str(e)}")
@@ -63,6 +119,7 @@ async def startup_db_client():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await EventHub.stop_change_stream()
     await Database.close_db()
 
 @app.post("/api/convert")
@@ -112,30 +169,7 @@ async def convert_coordinates(request: CoordinateRequest):
             print(f"  Elevation: {coord['elevation']:.2f}m")
             print(f"  Zone: {coord['zone']}")
         
-        # Create a temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Generate DXF file
-            output_path = os.path.join(temp_dir, "coordinates.dxf")
-            from utils.dxf_generator import create_dxf
-            create_dxf(utm_coordinates, output_path)
-            
-            # Read the file content
-            with open(output_path, 'rb') as f:
-                file_content = f.read()
-            
-            print("\n=== DXF Generation Successful ===")
-            print(f"File size: {len(file_content)} bytes")
-            
-            # Return the file
-            return Response(
-                content=file_content,
-                media_type="application/dxf",
-                headers={
-                    "Content-Disposition": "attachment; filename=coordinates.dxf",
-                    "X-Converted-Values": json.dumps(utm_coordinates),
-                    "Access-Control-Expose-Headers": "X-Converted-Values"
-                }
-            )
+        return dxf_response(utm_coordinates)
         
     except ValidationError as e:
         print("\n=== Validation Error ===")
@@ -148,6 +182,35 @@ async def convert_coordinates(request: CoordinateRequest):
         print("Request data:", request.dict())
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/convert/columns")
+async def convert_coordinate_columns(request: CoordinateColumnsRequest, accept: Optional[str] = Header(default=None)):
+    """Convert columnar coordinates to UTM.
+
+    Returns the converted values as parallel easting/northing/elevation/zone
+    arrays in a JSON body, or the DXF file when the client sends
+    ``Accept: application/dxf``. Values are never put in a header, which
+    would overflow proxy and browser header limits for large boundaries.
+    """
+    try:
+        print("\n=== Columnar Coordinate Conversion Request ===")
+        
+        # Validated in bulk and converted without building per-point objects
+        projected = project_coordinate_columns(request.dict())
+        print(f"Converted {len(projected['zone'])} coordinates")
+        
+        if accept and "application/dxf" in accept:
+            return dxf_response(utm_columns_to_rows(projected), include_values=False)
+        return projected
+        
+    except CoordinateValidationError as e:
+        print("\n=== Validation Error ===")
+        print(f"Invalid values: {len(e.errors)}")
+        raise HTTPException(status_code=422, detail=e.errors)
+    except Exception as e:
+        print("\n=== Error in Conversion ===")
+        print("Error:", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
 def get_ist_time():
     """Get current time in Indian Standard Time (IST)"""
     utc_now = datetime.now(timezone.utc)
@@ -155,6 +218,22 @@ def get_ist_time():
     ist_time = utc_now + ist_offset
     return ist_time.replace(tzinfo=timezone(ist_offset))
 
+def to_ist_isoformat(value):
+    """Format a stored timestamp as an IST ISO string, passing other values through"""
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone(timedelta(hours=5, minutes=30))).isoformat()
+
+def format_certificate(certificate):
+    """Format a stored certificate for the frontend"""
+    formatted = dict(certificate)
+    formatted["_id"] = str(formatted["_id"])
+    formatted["created_at"] = to_ist_isoformat(formatted.get("created_at"))
+    formatted["updated_at"] = to_ist_isoformat(formatted.get("updated_at"))
+    return formatted
+
 @app.post("/api/certificates")
 async def create_certificate(certificate: CertificateCreate):
     try:
@@ -177,11 +256,19 @@ async def create_certificate(certificate: CertificateCreate):
         current_time = get_ist_time()
         certificate_dict["created_at"] = current_time
         certificate_dict["updated_at"] = current_time
+        certificate_dict["revision"] = 1
         
         print("5. Data being sent to insert_one:", certificate_dict)
         
         print("5. Attempting to insert certificate...")
-        result = await db.certificates.insert_one(certificate_dict)
+        # The certificate and its first revision commit together
+        async def insert_with_revision(session):
+            inserted = await db.certificates.insert_one(dict(certificate_dict), session=session)
+            await record_revision(db, inserted.inserted_id, 1, None, certificate_dict,
+                                  current_time, session=session)
+            return inserted
+        
+        result = await Database.run_transaction(insert_with_revision)
         print(f"6. Insert result - Inserted ID: {result.inserted_id}")
         
         # Verify the document was inserted by counting documents
@@ -212,6 +299,8 @@ async def create_certificate(certificate: CertificateCreate):
         
         # Print final document for verification
         print("11. Final certificate document:", created_certificate)
+        invalidate_certificate()
+        EventHub.publish_from_handler("created", created_certificate["_id"], created_certificate)
         print("=== Certificate Creation Successful ===\n")
         return created_certificate
         
@@ -227,49 +316,115 @@ async def create_certificate(certificate: CertificateCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/certificates")
-async def get_certificates(skip: int = 0, limit: int = 10):
+async def get_certificates(
+    skip: int = 0,
+    limit: int = 10,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None)
+):
     try:
-        db = Database.get_db()
-        certificates = await db.certificates.find().sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
-        
-        # Format the certificates for frontend
-        formatted_certificates = []
-        for cert in certificates:
-            # Convert ObjectId to string
-            cert["_id"] = str(cert["_id"])
-            
-            # Ensure timestamps are in IST
-            if isinstance(cert["created_at"], datetime):
-                if cert["created_at"].tzinfo is None:
-                    cert["created_at"] = cert["created_at"].replace(tzinfo=timezone.utc)
-                cert["created_at"] = cert["created_at"].astimezone(timezone(timedelta(hours=5, minutes=30))).isoformat()
+        key = list_key(skip, limit)
+        cached = lookup(key)
+        if cached is None:
+            generation = read_generation(key)
+            db = Database.get_db()
+            certificates = await db.certificates.find().sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
             
-            if isinstance(cert["updated_at"], datetime):
-                if cert["updated_at"].tzinfo is None:
-                    cert["updated_at"] = cert["updated_at"].replace(tzinfo=timezone.utc)
-                cert["updated_at"] = cert["updated_at"].astimezone(timezone(timedelta(hours=5, minutes=30))).isoformat()
-            
-            formatted_certificates.append(cert)
-        
-        return formatted_certificates
+            # Format the certificates for frontend
+            cached = {
+                "validators": validators_for(certificates, last_modified=False),
+                "body": [format_certificate(cert) for cert in certificates]
+            }
+            fill(key, cached, generation)
+        
+        headers = conditional_headers(cached["validators"])
+        if is_not_modified(cached["validators"], if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=cached["body"], headers=headers)
     except Exception as e:
         print(f"Error fetching certificates: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Declared before /api/certificates/{certificate_id} so "events" is not taken as an ID
+@app.get("/api/certificates/events")
+async def certificate_events(
+    request: Request,
+    last_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """Server-sent events stream of certificate created/updated/deleted events.
+
+    Clients resume from the Last-Event-ID header (sent automatically by
+    EventSource on reconnect) or the last_id query parameter. Every
+    connection starts with a "ready" event, or with a "reset" event if the
+    id cannot be resumed here and the client must refetch the list. Both
+    carry the event source, so clients know whether writes handled by other
+    workers are included.
+    """
+    resume_from = last_event_id if last_event_id is not None else last_id
+    queue, backlog, position = EventHub.subscribe(resume_from)
+
+    def format_event(event):
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    async def stream():
+        try:
+            if backlog is None:
+                yield format_event({"id": position, "type": "reset", "source": EventHub.source()})
+            else:
+                for event in backlog:
+                    yield format_event(event)
+                yield format_event({"id": position, "type": "ready", "source": EventHub.source()})
+
+            while queue in EventHub.subscribers:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            EventHub.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/certificates/{certificate_id}")
-async def get_certificate(certificate_id: str):
+async def get_certificate(
+    certificate_id: str,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None)
+):
     try:
-        db = Database.get_db()
-        certificate = await db.certificates.find_one({"_id": ObjectId(certificate_id)})
-        if not certificate:
-            raise HTTPException(status_code=404, detail="Certificate not found")
-        
-        # Format the certificate for frontend
-        certificate["_id"] = str(certificate["_id"])
-        certificate["created_at"] = certificate["created_at"].isoformat()
-        certificate["updated_at"] = certificate["updated_at"].isoformat()
-        
-        return certificate
+        key = certificate_key(certificate_id)
+        cached = lookup(key)
+        if cached is None:
+            generation = read_generation(key)
+            db = Database.get_db()
+            certificate = await db.certificates.find_one({"_id": ObjectId(certificate_id)})
+            if not certificate:
+                raise HTTPException(status_code=404, detail="Certificate not found")
+            
+            # Format the certificate for frontend
+            validators = validators_for([certificate])
+            certificate["_id"] = str(certificate["_id"])
+            certificate["created_at"] = certificate["created_at"].isoformat()
+            certificate["updated_at"] = certificate["updated_at"].isoformat()
+            cached = {"validators": validators, "body": certificate}
+            fill(key, cached, generation)
+        
+        headers = conditional_headers(cached["validators"])
+        if is_not_modified(cached["validators"], if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=cached["body"], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching certificate: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -301,17 +456,37 @@ async def update_certificate(certificate_id: str, certificate: CertificateUpdate
         
         print("3. Prepared update data:", update_data)
         
-        # Perform the update
-        result = await db.certificates.update_one(
-            {"_id": ObjectId(certificate_id)},
-            {"$set": update_data}
-        )
-        
-        print(f"Update result - Modified count: {result.modified_count}")
+        # The update and its revision commit together, so a version is never
+        # allocated without being stored
+        async def update_with_revision(session):
+            # Certificates created before revisions get their stored state as version 1
+            if "revision" not in existing_certificate:
+                await ensure_revision_baseline(db, ObjectId(certificate_id), update_data["updated_at"],
+                                               session=session)
+            
+            # Perform the update, bumping the revision counter in the same write so the
+            # returned document is the exact predecessor of this version
+            previous_certificate = await db.certificates.find_one_and_update(
+                {"_id": ObjectId(certificate_id)},
+                {"$set": update_data, "$inc": {"revision": 1}},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if previous_certificate is None:
+                print("No documents were modified")
+                raise HTTPException(status_code=404, detail="Certificate not found or no changes made")
+            
+            version = previous_certificate["revision"] + 1
+            await record_revision(
+                db, ObjectId(certificate_id), version, previous_certificate,
+                {**previous_certificate, **update_data}, update_data["updated_at"],
+                session=session
+            )
+            return version
         
-        if result.modified_count == 0:
-            print("No documents were modified")
-            raise HTTPException(status_code=404, detail="Certificate not found or no changes made")
+        version = await Database.run_transaction(update_with_revision)
+        print(f"Recorded revision: {version}")
+        invalidate_certificate(certificate_id)
         
         # Fetch and return the updated certificate
         updated_certificate = await db.certificates.find_one({"_id": ObjectId(certificate_id)})
@@ -330,6 +505,7 @@ async def update_certificate(certificate_id: str, certificate: CertificateUpdate
                     updated_certificate["updated_at"] = updated_certificate["updated_at"].replace(tzinfo=timezone.utc)
                 updated_certificate["updated_at"] = updated_certificate["updated_at"].astimezone(timezone(timedelta(hours=5, minutes=30))).isoformat()
             
+            EventHub.publish_from_handler("updated", updated_certificate["_id"], updated_certificate)
             print("Successfully updated certificate")
             print("=== Certificate Update Successful ===\n")
             return updated_certificate
@@ -343,11 +519,67 @@ async def update_certificate(certificate_id: str, certificate: CertificateUpdate
 @app.delete("/api/certificates/{certificate_id}")
 async def delete_certificate(certificate_id: str):
     db = Database.get_db()
-    result = await db.certificates.delete_one({"_id": ObjectId(certificate_id)})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Certificate not found")
+    
+    # The certificate and its revisions are removed together
+    async def delete_with_revisions(session):
+        result = await db.certificates.delete_one({"_id": ObjectId(certificate_id)}, session=session)
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Certificate not found")
+        await delete_revisions(db, ObjectId(certificate_id), session=session)
+    
+    await Database.run_transaction(delete_with_revisions)
+    invalidate_certificate(certificate_id)
+    EventHub.publish_from_handler("deleted", certificate_id)
     return {"message": "Certificate deleted successfully"}
 
+@app.get("/api/certificates/{certificate_id}/revisions")
+async def get_certificate_revisions(certificate_id: str):
+    try:
+        db = Database.get_db()
+        revisions = await list_revisions(db, ObjectId(certificate_id))
+        if not revisions:
+            # Certificates that predate revisions have none until their first update
+            exists = await db.certificates.count_documents({"_id": ObjectId(certificate_id)}, limit=1)
+            if not exists:
+                raise HTTPException(status_code=404, detail="Certificate not found")
+        for revision in revisions:
+            revision["created_at"] = to_ist_isoformat(revision["created_at"])
+        return revisions
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching revisions: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/certificates/{certificate_id}/revisions/diff")
+async def get_certificate_revision_diff(certificate_id: str, from_version: int, to_version: int):
+    try:
+        db = Database.get_db()
+        diff = await diff_revisions(db, ObjectId(certificate_id), from_version, to_version)
+        set_fields = diff["delta"].get("set", {})
+        if "updated_at" in set_fields:
+            set_fields["updated_at"] = to_ist_isoformat(set_fields["updated_at"])
+        return diff
+    except RevisionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error diffing revisions: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/certificates/{certificate_id}/revisions/{version}")
+async def get_certificate_revision(certificate_id: str, version: int):
+    try:
+        db = Database.get_db()
+        revision = await get_revision(db, ObjectId(certificate_id), version)
+        revision["updated_at"] = to_ist_isoformat(revision.get("updated_at"))
+        revision["revision_created_at"] = to_ist_isoformat(revision["revision_created_at"])
+        return revision
+    except RevisionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error fetching revision: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000) 
\ No newline at end of file
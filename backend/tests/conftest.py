@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend imports its packages relative to backend/, as when run with uvicorn
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from utils.coordinate_converter import (
+    CoordinateValidationError, columns_to_decimal, process_coordinate_columns,
+    process_coordinates
+)
+
+def _dms_columns(points):
+    """Turn per-point DMS dictionaries into parallel columns."""
+    fields = ['lat_deg', 'lat_min', 'lat_sec', 'lat_dir',
+              'lon_deg', 'lon_min', 'lon_sec', 'lon_dir', 'amsl']
+    return {field: [point[field] for point in points] for field in fields}
+
+def _point(lat_deg=17, lat_min=14, lat_sec=2.5, lat_dir='N',
+           lon_deg=78, lon_min=25, lon_sec=44.1, lon_dir='E', amsl=560.0):
+    return dict(lat_deg=lat_deg, lat_min=lat_min, lat_sec=lat_sec, lat_dir=lat_dir,
+                lon_deg=lon_deg, lon_min=lon_min, lon_sec=lon_sec, lon_dir=lon_dir, amsl=amsl)
+
+def _errors(columns):
+    with pytest.raises(CoordinateValidationError) as excinfo:
+        columns_to_decimal(columns)
+    return [(error["index"], error["field"]) for error in excinfo.value.errors]
+
+def test_columnar_matches_per_point_conversion():
+    points = [_point(), _point(lat_sec=30.0, amsl=561.5), _point(lat_dir='S', lon_dir='W')]
+    columnar = process_coordinate_columns(_dms_columns(points))
+    per_point = process_coordinates(points)
+    assert [c['zone'] for c in columnar] == [c['zone'] for c in per_point]
+    np.testing.assert_allclose([c['easting'] for c in columnar], [c['easting'] for c in per_point])
+    np.testing.assert_allclose([c['northing'] for c in columnar], [c['northing'] for c in per_point])
+
+def test_component_errors_are_reported_by_index():
+    points = [_point(), _point(lat_deg=91), _point(lon_dir='X'), _point(lat_min=61)]
+    assert _errors(_dms_columns(points)) == [
+        (1, 'lat_deg'), (1, 'lat'), (2, 'lon_dir'), (3, 'lat_min')
+    ]
+
+def test_combined_latitude_out_of_range():
+    # Every component is in range, but 90° 59' 59" N is past the pole
+    points = [_point(), _point(lat_deg=90, lat_min=59, lat_sec=59)]
+    assert _errors(_dms_columns(points)) == [(1, 'lat')]
+
+def test_decimal_columns_are_range_checked():
+    assert _errors({'lat': [10.0, -91.0], 'lon': [181.0, 0.0], 'amsl': [1.0, float('nan')]}) == [
+        (0, 'lon'), (1, 'amsl'), (1, 'lat')
+    ]
+
+def test_mismatched_column_lengths():
+    assert _errors({'lat': [10.0, 11.0], 'lon': [78.0], 'amsl': [1.0, 2.0]}) == [(None, None)]
+
+def test_longitude_180_stays_in_zone_60():
+    columnar = process_coordinate_columns({'lat': [10.0, -10.0], 'lon': [180.0, 179.9], 'amsl': [0.0, 0.0]})
+    assert [c['zone'] for c in columnar] == ['60N', '60S']
+    assert all(np.isfinite(c['easting']) and np.isfinite(c['northing']) for c in columnar)
+    # 180° E and 180° W are the same meridian
+    west = process_coordinate_columns(_dms_columns([_point(lon_deg=180, lon_min=0, lon_sec=0, lon_dir='W')]))
+    assert west[0]['zone'] == '1N'
@@ -0,0 +1,163 @@
+import asyncio
+import copy
+from datetime import datetime
+
+import pytest
+
+from utils import revisions
+from utils.revisions import (
+    RevisionNotFoundError, apply_delta, compute_delta, get_revision, record_revision
+)
+
+def _matches(document, query):
+    for key, condition in query.items():
+        value = document.get(key)
+        if isinstance(condition, dict):
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+            if "$lt" in condition and not value < condition["$lt"]:
+                return False
+            if "$lte" in condition and not value <= condition["$lte"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents.sort(key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return copy.deepcopy(self.documents)
+
+class FakeCollection:
+    """Just enough of a Motor collection for the revisions module"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document, session=None):
+        self.documents.append(copy.deepcopy(document))
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.documents if _matches(d, query)])
+
+    async def find_one(self, query, projection=None, sort=None, session=None):
+        cursor = self.find(query)
+        if sort:
+            cursor.sort(*sort[0])
+        return copy.deepcopy(cursor.documents[0]) if cursor.documents else None
+
+    async def count_documents(self, query, limit=None):
+        return len([d for d in self.documents if _matches(d, query)])
+
+def _fake_db():
+    return {revisions.REVISIONS_COLLECTION: FakeCollection()}
+
+def _point(i, amsl=500.0):
+    return {"lat_deg": 17, "lat_min": 14, "lat_sec": float(i), "lat_dir": "N",
+            "lon_deg": 78, "lon_min": 25, "lon_sec": float(i), "lon_dir": "E", "amsl": amsl}
+
+BASE = {
+    "survey_no": "101",
+    "owner": "GHIAL",
+    "coordinates": [_point(i) for i in range(4)],
+    "userName": "Surveyor",
+}
+
+@pytest.mark.parametrize("new", [
+    # scalar change
+    {**BASE, "owner": "GMR"},
+    # coordinates shrink
+    {**BASE, "coordinates": BASE["coordinates"][:2]},
+    # coordinates grow, with one existing point edited
+    {**BASE, "coordinates": [_point(0, amsl=510.0)] + BASE["coordinates"][1:] + [_point(9)]},
+    # coordinates and an optional field removed
+    {k: v for k, v in BASE.items() if k not in ("coordinates", "userName")},
+    # coordinates emptied
+    {**BASE, "coordinates": []},
+])
+def test_delta_round_trip(new):
+    delta = compute_delta(BASE, new)
+    assert apply_delta(BASE, delta) == new
+    assert apply_delta(new, compute_delta(new, BASE)) == BASE
+
+def test_delta_only_stores_changed_point_fields():
+    new = copy.deepcopy(BASE)
+    new["coordinates"][2]["amsl"] = 512.5
+    assert compute_delta(BASE, new) == {
+        "coordinates": {"length": 4, "changes": [[2, {"amsl": 512.5}]]}
+    }
+    assert compute_delta(BASE, copy.deepcopy(BASE)) == {}
+
+async def _write_history(db, states):
+    for version, state in enumerate(states, 1):
+        previous = states[version - 2] if version > 1 else None
+        await record_revision(db, "cert", version, previous, state, datetime(2025, 1, version))
+
+def _edited_states(count):
+    states = [copy.deepcopy(BASE)]
+    for i in range(1, count):
+        state = copy.deepcopy(states[-1])
+        state["owner"] = f"owner {i}"
+        state["coordinates"][i % 4]["amsl"] = 500.0 + i
+        states.append(state)
+    return states
+
+def _content(rebuilt):
+    return {k: v for k, v in rebuilt.items()
+            if k not in ("certificate_id", "version", "revision_created_at")}
+
+def test_rebuild_across_snapshot_boundary(monkeypatch):
+    # Small ratio so the history contains several snapshots
+    monkeypatch.setattr(revisions, "SNAPSHOT_DELTA_RATIO", 0.3)
+    db = _fake_db()
+    states = _edited_states(12)
+
+    async def run():
+        await _write_history(db, states)
+        kinds = [r["kind"] for r in db[revisions.REVISIONS_COLLECTION].documents]
+        assert kinds[0] == "snapshot"
+        assert "snapshot" in kinds[1:] and "delta" in kinds
+        for version, state in enumerate(states, 1):
+            assert _content(await get_revision(db, "cert", version)) == state
+
+    asyncio.run(run())
+
+def test_small_edits_do_not_force_snapshots():
+    db = _fake_db()
+    # A realistic boundary, where full copies would dominate storage
+    states = [{**BASE, "coordinates": [_point(i) for i in range(200)]}]
+    for i in range(1, 30):
+        state = copy.deepcopy(states[-1])
+        state["coordinates"][i]["amsl"] = 500.0 + i
+        states.append(state)
+
+    async def run():
+        await _write_history(db, states)
+
+    asyncio.run(run())
+    kinds = [r["kind"] for r in db[revisions.REVISIONS_COLLECTION].documents]
+    assert kinds == ["snapshot"] + ["delta"] * 29
+
+def test_gap_in_history_is_detected():
+    db = _fake_db()
+    states = _edited_states(5)
+
+    async def run():
+        await _write_history(db, states)
+        collection = db[revisions.REVISIONS_COLLECTION]
+        collection.documents = [r for r in collection.documents if r["version"] != 3]
+        assert _content(await get_revision(db, "cert", 2)) == states[1]
+        with pytest.raises(RevisionNotFoundError, match="incomplete"):
+            await get_revision(db, "cert", 4)
+        with pytest.raises(RevisionNotFoundError, match="not found"):
+            await get_revision(db, "cert", 6)
+
+    asyncio.run(run())
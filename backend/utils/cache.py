@@ -0,0 +1,317 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv("CERTIFICATE_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CERTIFICATE_CACHE_TTL_SECONDS", "300"))
+# Path to a SQLite file shared by all gunicorn workers on this host. When unset,
+# each worker keeps its own in-process LRU, which only sees invalidations from
+# its own writes. Its entries therefore live for a few seconds only, and list
+# pages are not cached at all.
+CACHE_SHARED_PATH = os.getenv("CERTIFICATE_CACHE_PATH")
+LOCAL_CACHE_TTL_SECONDS = float(os.getenv("CERTIFICATE_LOCAL_CACHE_TTL_SECONDS", "5"))
+
+CERTIFICATE_PREFIX = "certificate:"
+LIST_PREFIX = "list:"
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.generations: Dict[str, int] = {}
+
+    def generation(self, key: str) -> int:
+        return self.generations.get(key, 0)
+
+    def bump(self, key: str):
+        self.generations[key] = self.generation(key) + 1
+
+    def set_if_generation(self, key: str, value: Any, generation_key: str, generation: int):
+        # No await between the check and the write, so this is atomic within the event loop
+        if self.generation(generation_key) == generation:
+            self.set(key, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            del self.entries[key]
+
+# How long a SQLite call may wait for another worker's lock. Calls run on the
+# event loop, so this is kept short and a busy store is treated as a miss.
+SHARED_BUSY_TIMEOUT_SECONDS = float(os.getenv("CERTIFICATE_CACHE_BUSY_TIMEOUT_SECONDS", "0.05"))
+
+def _cache_failure_is_miss(default=None):
+    """Log cache errors and return ``default`` so requests fall back to MongoDB"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error(f"Certificate cache {method.__name__} failed: {str(e)}")
+                return default
+        return wrapper
+    return decorator
+
+class SharedCache:
+    """SQLite-backed cache shared across worker processes on one host
+
+    Every operation is best effort: a locked or broken store, or a value that
+    cannot be serialized, is logged and treated as a miss or a no-op.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=SHARED_BUSY_TIMEOUT_SECONDS,
+                                    check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        # Per-certificate generations written by earlier versions
+        self.conn.execute(
+            "DELETE FROM generations WHERE key NOT IN (?, ?)", (CERTIFICATE_PREFIX, LIST_PREFIX)
+        )
+
+    @_cache_failure_is_miss(-1)
+    def generation(self, key: str) -> int:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT generation FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    @_cache_failure_is_miss()
+    def bump(self, key: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO generations (key, generation) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET generation = generation + 1",
+                (key,)
+            )
+
+    @_cache_failure_is_miss()
+    def set_if_generation(self, key: str, value: Any, generation_key: str, generation: int):
+        now = time.time()
+        with self.lock:
+            # One statement, so a bump from another worker cannot slip in between
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+                "SELECT ?, ?, ?, ? WHERE COALESCE("
+                "(SELECT generation FROM generations WHERE key = ?), 0) = ?",
+                (key, json.dumps(value), now + self.ttl, now, generation_key, generation)
+            )
+            self.conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    @_cache_failure_is_miss()
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    @_cache_failure_is_miss()
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now)
+            )
+            self.conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    @_cache_failure_is_miss()
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    @_cache_failure_is_miss()
+    def delete_prefix(self, prefix: str):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+
+def _create_cache():
+    if CACHE_SHARED_PATH:
+        try:
+            cache = SharedCache(CACHE_SHARED_PATH, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+            logger.info(f"Using shared certificate cache at {CACHE_SHARED_PATH}")
+            return cache
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open shared certificate cache, using in-process cache: {str(e)}")
+    return LRUCache(CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL_SECONDS)
+
+certificate_cache = _create_cache()
+
+def certificate_key(certificate_id: str) -> str:
+    return f"{CERTIFICATE_PREFIX}{certificate_id}"
+
+def list_key(skip: int, limit: int) -> str:
+    return f"{LIST_PREFIX}{skip}:{limit}"
+
+def _generation_key(key: str) -> str:
+    # One generation per key family rather than per key, so the counters stay
+    # bounded. A write to any certificate only skips fills that were in flight.
+    return LIST_PREFIX if key.startswith(LIST_PREFIX) else CERTIFICATE_PREFIX
+
+def _is_cacheable(key: str) -> bool:
+    # A stale list page on another worker would hide creates and deletes
+    return isinstance(certificate_cache, SharedCache) or not key.startswith(LIST_PREFIX)
+
+def lookup(key: str) -> Optional[Any]:
+    """Cached value for ``key``, or None on a miss or if ``key`` is not cached."""
+    if not _is_cacheable(key):
+        return None
+    return certificate_cache.get(key)
+
+def read_generation(key: str) -> int:
+    """Generation of ``key`` to pass to ``fill`` once the database read is done."""
+    return certificate_cache.generation(_generation_key(key))
+
+def fill(key: str, value: Any, generation: int):
+    """
+    Store the result of a read-through miss.
+
+    The entry is skipped if a write invalidated ``key`` while the database
+    read was in flight, so pre-write data is never cached for the full TTL.
+    """
+    if _is_cacheable(key):
+        certificate_cache.set_if_generation(key, value, _generation_key(key), generation)
+
+def invalidate_certificate(certificate_id: Optional[str] = None):
+    """
+    Drop cached reads affected by a write.
+
+    The single-certificate entry is dropped only for the certificate that
+    changed. List pages are always dropped, since any create, update or
+    delete can shift their contents or order. Generations are bumped first
+    so reads that started before the write do not store their result.
+
+    Args:
+        certificate_id: ID of the written certificate, or None for a create
+    """
+    if certificate_id is not None:
+        certificate_cache.bump(CERTIFICATE_PREFIX)
+        certificate_cache.delete(certificate_key(certificate_id))
+    certificate_cache.bump(LIST_PREFIX)
+    certificate_cache.delete_prefix(LIST_PREFIX)
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def validators_for(certificates: Iterable[Dict], last_modified: bool = True) -> Dict[str, Optional[str]]:
+    """
+    Build ETag and Last-Modified values from stored certificates.
+
+    Args:
+        certificates: Stored certificates with ``_id`` and ``updated_at``
+        last_modified: Whether to derive Last-Modified. List pages pass False:
+            deleting or shifting items can lower a page's newest updated_at,
+            so it cannot tell whether the page changed.
+
+    Returns:
+        Dictionary with ``etag`` and ``last_modified`` (None for an empty list
+        or when not requested)
+    """
+    digest = hashlib.sha1()
+    latest = None
+    for certificate in certificates:
+        updated_at = certificate.get("updated_at")
+        if isinstance(updated_at, datetime):
+            updated_at = _as_utc(updated_at)
+            latest = updated_at if latest is None else max(latest, updated_at)
+            stamp = updated_at.isoformat()
+        else:
+            stamp = str(updated_at)
+        digest.update(f"{certificate['_id']}@{stamp};".encode())
+    return {
+        "etag": f'W/"{digest.hexdigest()}"',
+        "last_modified": (format_datetime(latest.replace(microsecond=0), usegmt=True)
+                          if latest and last_modified else None)
+    }
+
+def conditional_headers(validators: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """Validator headers for 200 and 304 responses."""
+    # Browsers may otherwise reuse the response heuristically from Last-Modified
+    # without revalidating, and miss later edits
+    headers = {"ETag": validators["etag"], "Cache-Control": "no-cache"}
+    if validators["last_modified"]:
+        headers["Last-Modified"] = validators["last_modified"]
+    return headers
+
+def is_not_modified(validators: Dict[str, Optional[str]], if_none_match: Optional[str],
+                    if_modified_since: Optional[str]) -> bool:
+    """
+    Evaluate conditional request headers against cached validators.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or validators["etag"] in candidates
+    if if_modified_since is not None and validators["last_modified"]:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(validators["last_modified"]) <= _as_utc(since)
+    return False
@@ -1,7 +1,8 @@
 from pyproj import Proj
+import numpy as np
 import os
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from utils.dxf_generator import create_dxf
 
 # Configure logging
@@ -19,6 +20,16 @@ class DXFGenerationError(Exception):
     """Custom exception for DXF generation errors"""
     pass
 
+class CoordinateValidationError(CoordinateConversionError):
+    """Custom exception for invalid columnar coordinates, carrying per-index errors"""
+    def __init__(self, errors: List[Dict]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid coordinate value(s)")
+
+DMS_COLUMNS = ['lat_deg', 'lat_min', 'lat_sec', 'lat_dir',
+               'lon_deg', 'lon_min', 'lon_sec', 'lon_dir', 'amsl']
+DECIMAL_COLUMNS = ['lat', 'lon', 'amsl']
+
 def dms_to_decimal(degrees: float, minutes: float, seconds: float, direction: str) -> float:
     """
     Convert degrees, minutes, seconds to decimal degrees.
@@ -115,6 +126,171 @@ def process_coordinates(coordinates: List[Dict]) -> List[Dict]:
     
     return utm_coordinates
 
+def _range_errors(values: np.ndarray, field: str, low: float, high: float) -> List[Dict]:
+    """Report every index of ``values`` that is not finite or outside [low, high]."""
+    invalid = ~np.isfinite(values) | (values < low) | (values > high)
+    return [
+        {"index": int(i), "field": field, "message": f"{field} must be between {low} and {high}"}
+        for i in np.flatnonzero(invalid)
+    ]
+
+def _direction_errors(values: np.ndarray, field: str, allowed: List[str]) -> List[Dict]:
+    """Report every index of ``values`` that is not one of the allowed directions."""
+    invalid = ~np.isin(values, allowed)
+    return [
+        {"index": int(i), "field": field, "message": f"{field} must be {' or '.join(allowed)}"}
+        for i in np.flatnonzero(invalid)
+    ]
+
+def columns_to_decimal(columns: Dict[str, Optional[List]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Validate columnar coordinates in bulk and convert them to decimal degrees.
+    
+    Args:
+        columns: Either parallel DMS arrays (lat_deg, lat_min, lat_sec, lat_dir,
+                 lon_deg, lon_min, lon_sec, lon_dir, amsl) or parallel decimal
+                 arrays (lat, lon, amsl)
+    
+    Returns:
+        Tuple of (latitudes, longitudes, elevations) as NumPy arrays
+    
+    Raises:
+        CoordinateValidationError: With one entry per invalid value, by index
+    """
+    present = {name for name, values in columns.items() if values is not None}
+    if set(DMS_COLUMNS) <= present:
+        required = DMS_COLUMNS
+    elif set(DECIMAL_COLUMNS) <= present:
+        required = DECIMAL_COLUMNS
+    else:
+        raise CoordinateValidationError([{
+            "index": None,
+            "field": None,
+            "message": f"Provide either {DMS_COLUMNS} or {DECIMAL_COLUMNS}"
+        }])
+    
+    lengths = {name: len(columns[name]) for name in required}
+    count = lengths[required[0]]
+    if count == 0 or any(length != count for length in lengths.values()):
+        raise CoordinateValidationError([{
+            "index": None,
+            "field": None,
+            "message": f"Coordinate columns must be non-empty and of equal length, got {lengths}"
+        }])
+    
+    amsl = np.asarray(columns['amsl'], dtype=float)
+    errors = [
+        {"index": int(i), "field": 'amsl', "message": "amsl must be a finite number"}
+        for i in np.flatnonzero(~np.isfinite(amsl))
+    ]
+    
+    if required is DECIMAL_COLUMNS:
+        lat = np.asarray(columns['lat'], dtype=float)
+        lon = np.asarray(columns['lon'], dtype=float)
+        errors += _range_errors(lat, 'lat', -90, 90)
+        errors += _range_errors(lon, 'lon', -180, 180)
+    else:
+        values = {name: np.asarray(columns[name], dtype=float)
+                  for name in DMS_COLUMNS if not name.endswith('_dir')}
+        lat_dir = np.asarray(columns['lat_dir'], dtype=str)
+        lon_dir = np.asarray(columns['lon_dir'], dtype=str)
+        errors += _range_errors(values['lat_deg'], 'lat_deg', 0, 90)
+        errors += _range_errors(values['lon_deg'], 'lon_deg', 0, 180)
+        for name in ('lat_min', 'lat_sec', 'lon_min', 'lon_sec'):
+            errors += _range_errors(values[name], name, 0, 60)
+        errors += _direction_errors(lat_dir, 'lat_dir', ['N', 'S'])
+        errors += _direction_errors(lon_dir, 'lon_dir', ['E', 'W'])
+        
+        lat = values['lat_deg'] + values['lat_min'] / 60 + values['lat_sec'] / 3600
+        lon = values['lon_deg'] + values['lon_min'] / 60 + values['lon_sec'] / 3600
+        lat = np.where(lat_dir == 'S', -lat, lat)
+        lon = np.where(lon_dir == 'W', -lon, lon)
+        
+        # Components can each be in range while the combined value is not,
+        # e.g. 90° 59' 59" N
+        errors += _range_errors(lat, 'lat', -90, 90)
+        errors += _range_errors(lon, 'lon', -180, 180)
+    
+    if errors:
+        errors.sort(key=lambda error: error["index"])
+        logger.error(f"Columnar coordinate validation failed with {len(errors)} error(s)")
+        raise CoordinateValidationError(errors)
+    
+    return lat, lon, amsl
+
+def project_coordinate_columns(columns: Dict[str, Optional[List]]) -> Dict[str, List]:
+    """
+    Project columnar coordinates to UTM without per-point objects.
+    
+    Points are projected in bulk, one projection call per UTM zone.
+    
+    Args:
+        columns: Parallel coordinate arrays, see ``columns_to_decimal``
+    
+    Returns:
+        Dictionary of parallel easting, northing, elevation and zone lists,
+        in input order
+    
+    Raises:
+        CoordinateValidationError: If any value is invalid
+        CoordinateConversionError: If projection fails
+    """
+    lat, lon, amsl = columns_to_decimal(columns)
+    logger.info(f"Starting columnar processing of {len(lat)} coordinates")
+    
+    # 180° is the eastern edge of zone 60, not the start of a zone 61
+    zone_numbers = np.minimum(((lon + 180) / 6).astype(int) + 1, 60)
+    south = lat < 0
+    easting = np.empty_like(lat)
+    northing = np.empty_like(lat)
+    
+    try:
+        for zone_number, is_south in set(zip(zone_numbers.tolist(), south.tolist())):
+            mask = (zone_numbers == zone_number) & (south == is_south)
+            utm_proj = Proj(proj='utm', zone=zone_number, ellps='WGS84', south=is_south)
+            easting[mask], northing[mask] = utm_proj(lon[mask], lat[mask])
+    except Exception as e:
+        logger.error(f"Error projecting columnar coordinates: {str(e)}")
+        raise CoordinateConversionError(f"Error projecting coordinates: {str(e)}")
+    
+    invalid = np.flatnonzero(~np.isfinite(easting) | ~np.isfinite(northing))
+    if invalid.size:
+        errors = [
+            {"index": int(i), "field": None, "message": "Coordinate cannot be projected to UTM"}
+            for i in invalid
+        ]
+        logger.error(f"Columnar coordinate projection failed for {len(errors)} coordinate(s)")
+        raise CoordinateValidationError(errors)
+    
+    zones = [f"{number}{'S' if is_south else 'N'}"
+             for number, is_south in zip(zone_numbers.tolist(), south.tolist())]
+    return {
+        'easting': easting.tolist(),
+        'northing': northing.tolist(),
+        'elevation': amsl.tolist(),
+        'zone': zones
+    }
+
+def utm_columns_to_rows(projected: Dict[str, List]) -> List[Dict]:
+    """Turn the output of ``project_coordinate_columns`` into per-point dictionaries."""
+    return [
+        {'easting': e, 'northing': n, 'elevation': h, 'zone': zone}
+        for e, n, h, zone in zip(projected['easting'], projected['northing'],
+                                 projected['elevation'], projected['zone'])
+    ]
+
+def process_coordinate_columns(columns: Dict[str, Optional[List]]) -> List[Dict]:
+    """
+    Process columnar coordinates to the per-point UTM format of ``process_coordinates``.
+    
+    Args:
+        columns: Parallel coordinate arrays, see ``columns_to_decimal``
+    
+    Returns:
+        List of dictionaries containing UTM coordinates, in input order
+    """
+    return utm_columns_to_rows(project_coordinate_columns(columns))
+
 def generate_dxf(utm_coordinates: List[Dict], output_dir: str = "output") -> str:
     """
     Generate a DXF file from UTM coordinates.
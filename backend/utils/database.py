@@ -47,6 +47,9 @@ class Database:
             logger.info("Creating indexes...")
             await cls.db.certificates.create_index("facility")
             await cls.db.certificates.create_index("created_at")
+            await cls.db.certificate_revisions.create_index(
+                [("certificate_id", 1), ("version", 1)], unique=True
+            )
             logger.info("Indexes created successfully")
             
         except Exception as e:
@@ -59,6 +62,12 @@ class Database:
             cls.client.close()
             logger.info("Closed MongoDB connection!")
 
+    @classmethod
+    async def run_transaction(cls, callback):
+        """Run ``callback(session)`` in a transaction, retrying transient errors"""
+        async with await cls.client.start_session() as session:
+            return await session.with_transaction(callback)
+
     @classmethod
     def get_db(cls):
         if cls.db is None:
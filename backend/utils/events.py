@@ -0,0 +1,238 @@
+from collections import deque
+from typing import Dict, Optional, Set
+import asyncio
+import uuid
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "handlers" publishes from the certificate endpoints of this process only.
+# "change_stream" tails MongoDB so events from every worker are seen; it
+# falls back to "handlers" when the server is not a replica set.
+EVENTS_SOURCE = os.getenv("CERTIFICATE_EVENTS_SOURCE", "handlers")
+EVENTS_BUFFER_SIZE = int(os.getenv("CERTIFICATE_EVENTS_BUFFER_SIZE", "1000"))
+SUBSCRIBER_QUEUE_SIZE = 100
+CHANGE_STREAM_MAX_RETRIES = int(os.getenv("CERTIFICATE_CHANGE_STREAM_MAX_RETRIES", "5"))
+
+class EventHub:
+    """In-process pub/sub hub for certificate create/update/delete events
+
+    Every event has an opaque ``id`` that clients send back as Last-Event-ID.
+    Events published from handlers use "<epoch>:<seq>", where the epoch is
+    unique to this process, so ids from a restarted server or another worker
+    are never mistaken for positions in this buffer. Events from the change
+    stream use the MongoDB resume token, which is the same in every worker.
+    """
+    epoch: str = uuid.uuid4().hex
+    sequence: int = 0
+    buffer: deque = deque(maxlen=EVENTS_BUFFER_SIZE)
+    subscribers: Set[asyncio.Queue] = set()
+    change_stream_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def publish(cls, event_type: str, certificate_id: str, certificate: Optional[Dict] = None,
+                event_id: Optional[str] = None) -> str:
+        """
+        Publish an event to every subscriber and keep it for resuming clients.
+
+        Args:
+            event_type: created, updated or deleted
+            certificate_id: ID of the certificate as a string
+            certificate: Formatted certificate for created/updated events
+            event_id: Cursor for the event, defaults to "<epoch>:<seq>"
+
+        Returns:
+            The id assigned to the event
+        """
+        cls.sequence += 1
+        event = {
+            "id": event_id or f"{cls.epoch}:{cls.sequence}",
+            "seq": cls.sequence,
+            "type": event_type,
+            "certificate_id": certificate_id,
+            "certificate": certificate,
+        }
+        return cls._broadcast(event)
+
+    @classmethod
+    def _broadcast(cls, event: Dict) -> str:
+        cls.buffer.append(event)
+        for queue in list(cls.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it, the client reconnects and resumes
+                logger.warning("Dropping slow certificate event subscriber")
+                cls.subscribers.discard(queue)
+        return event["id"]
+
+    @classmethod
+    def publish_from_handler(cls, event_type: str, certificate_id: str,
+                             certificate: Optional[Dict] = None) -> Optional[str]:
+        """Publish an event from a request handler unless the change stream is the source"""
+        if cls.change_stream_task is not None:
+            return None
+        return cls.publish(event_type, certificate_id, certificate)
+
+    @classmethod
+    def source(cls) -> str:
+        """Where events currently come from: "change_stream" or "handlers"."""
+        return "change_stream" if cls.change_stream_task is not None else "handlers"
+
+    @classmethod
+    def position(cls) -> str:
+        """Id of the latest event, or an epoch marker if nothing was published yet."""
+        return cls.buffer[-1]["id"] if cls.buffer else f"{cls.epoch}:0"
+
+    @classmethod
+    def subscribe(cls, last_event_id: Optional[str] = None):
+        """
+        Register a subscriber.
+
+        Args:
+            last_event_id: Id of the last event the client has applied, if resuming
+
+        Returns:
+            Tuple of (queue, backlog, position). The backlog holds the buffered
+            events after ``last_event_id``, or None if that id is unknown here
+            (older than the buffer, from a restarted server or from another
+            worker) and the client must refetch the list. ``position`` is the
+            id the client is at once the backlog is applied.
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        cls.subscribers.add(queue)
+        position = cls.position()
+
+        if last_event_id is None or last_event_id == position:
+            return queue, [], position
+        if last_event_id == f"{cls.epoch}:0" and cls.buffer[0]["seq"] == 1:
+            # Connected before the first event and nothing has been evicted since
+            return queue, list(cls.buffer), position
+        for index, event in enumerate(cls.buffer):
+            if event["id"] == last_event_id:
+                return queue, list(cls.buffer)[index + 1:], position
+        return queue, None, position
+
+    @classmethod
+    def unsubscribe(cls, queue: asyncio.Queue):
+        cls.subscribers.discard(queue)
+
+    @classmethod
+    def publish_reset(cls, source: str) -> str:
+        """
+        Tell every subscriber to refetch the list.
+
+        Used when events may have been missed or the event source changed, so
+        clients do not keep trusting a stream that no longer covers every write.
+        """
+        cls.sequence += 1
+        event = {"id": f"{cls.epoch}:{cls.sequence}", "seq": cls.sequence,
+                 "type": "reset", "source": source}
+        return cls._broadcast(event)
+
+    @classmethod
+    async def start_change_stream(cls, db, format_certificate):
+        """
+        Start feeding the hub from a MongoDB change stream if configured.
+
+        If the stream fails it is reopened with ``resume_after`` the last seen
+        token, so no change is skipped. If the history needed to resume is gone,
+        subscribers get a reset. After CHANGE_STREAM_MAX_RETRIES consecutive
+        failures the hub falls back to handler events and subscribers get a
+        reset announcing the new source.
+
+        Args:
+            db: Database handle
+            format_certificate: Callable formatting a stored certificate for clients
+        """
+        if EVENTS_SOURCE != "change_stream":
+            logger.info("Certificate events published from request handlers")
+            return
+
+        try:
+            stream = db.certificates.watch(full_document="updateLookup")
+            # Opening the cursor fails right away on standalone servers
+            first_change = await stream.try_next()
+        except Exception as e:
+            logger.warning(f"Change streams unavailable, publishing from handlers: {str(e)}")
+            return
+
+        async def consume():
+            nonlocal stream
+            resume_token = None
+            failures = 0
+            try:
+                if first_change is not None:
+                    cls._publish_change(first_change, format_certificate)
+                while True:
+                    try:
+                        async with stream:
+                            async for change in stream:
+                                cls._publish_change(change, format_certificate)
+                                resume_token = stream.resume_token
+                                failures = 0
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        resume_token = stream.resume_token or resume_token
+                        failures += 1
+                        if failures > CHANGE_STREAM_MAX_RETRIES:
+                            logger.error(f"Certificate change stream stopped: {str(e)}")
+                            break
+                        logger.warning(f"Certificate change stream failed, resuming: {str(e)}")
+                        await asyncio.sleep(min(2 ** failures, 30))
+
+                    try:
+                        stream = db.certificates.watch(full_document="updateLookup",
+                                                       resume_after=resume_token)
+                        first = await stream.try_next()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        # The token has fallen out of the oplog; start afresh and
+                        # make clients refetch what they missed
+                        logger.warning(f"Cannot resume certificate change stream: {str(e)}")
+                        resume_token = None
+                        stream = db.certificates.watch(full_document="updateLookup")
+                        first = await stream.try_next()
+                        cls.publish_reset("change_stream")
+                    if first is not None:
+                        cls._publish_change(first, format_certificate)
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Certificate change stream stopped: {str(e)}")
+            # Falling back to handler events: clients relying on the change
+            # stream must learn that writes from other workers are no longer pushed
+            cls.change_stream_task = None
+            cls.publish_reset("handlers")
+
+        cls.change_stream_task = asyncio.create_task(consume())
+        logger.info("Certificate events published from MongoDB change stream")
+
+    @classmethod
+    def _publish_change(cls, change: Dict, format_certificate):
+        operation = change.get("operationType")
+        certificate_id = str(change["documentKey"]["_id"])
+        # The resume token identifies the change identically in every worker
+        event_id = change["_id"]["_data"]
+        if operation == "insert":
+            cls.publish("created", certificate_id, format_certificate(change["fullDocument"]), event_id)
+        elif operation in ("update", "replace") and change.get("fullDocument"):
+            cls.publish("updated", certificate_id, format_certificate(change["fullDocument"]), event_id)
+        elif operation == "delete":
+            cls.publish("deleted", certificate_id, event_id=event_id)
+
+    @classmethod
+    async def stop_change_stream(cls):
+        if cls.change_stream_task is not None:
+            cls.change_stream_task.cancel()
+            try:
+                await cls.change_stream_task
+            except asyncio.CancelledError:
+                pass
+            cls.change_stream_task = None
@@ -0,0 +1,325 @@
+from bson import ObjectId, encode as bson_encode
+from datetime import datetime
+from typing import List, Dict, Optional
+from pymongo import ReturnDocument
+import copy
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REVISIONS_COLLECTION = "certificate_revisions"
+
+# A full snapshot is written once the deltas stored since the last snapshot
+# add up to more than SNAPSHOT_DELTA_RATIO times the size of the document.
+# Rebuilding a version then reads at most about (1 + ratio) document sizes,
+# and snapshots are only paid for in proportion to how much was edited.
+SNAPSHOT_DELTA_RATIO = float(os.getenv("REVISION_SNAPSHOT_DELTA_RATIO", "1.0"))
+# Upper bound on the number of deltas replayed, for histories of tiny edits
+MAX_DELTA_CHAIN = int(os.getenv("REVISION_MAX_DELTA_CHAIN", "1000"))
+
+# Fields that are part of the document identity rather than its content.
+# "revision" is the version counter kept on the certificate itself; it is
+# incremented in the same atomic update as the change it versions.
+UNTRACKED_FIELDS = ("_id", "created_at", "revision")
+
+class RevisionNotFoundError(Exception):
+    """Custom exception for missing certificate revisions"""
+    pass
+
+def _tracked_fields(document: Dict) -> Dict:
+    """Return a deep copy of the certificate content that is versioned."""
+    return {
+        key: copy.deepcopy(value)
+        for key, value in document.items()
+        if key not in UNTRACKED_FIELDS
+    }
+
+def _encoded_size(document: Dict) -> int:
+    """Size of a document as stored by MongoDB, in bytes."""
+    return len(bson_encode(document))
+
+def needs_snapshot(delta_bytes: int, chain_length: int, document_bytes: int) -> bool:
+    """
+    Whether a revision should be stored as a full snapshot.
+
+    Args:
+        delta_bytes: Delta bytes since the last snapshot, including this revision
+        chain_length: Deltas since the last snapshot, including this revision
+        document_bytes: Size of the full document at this revision
+    """
+    return (delta_bytes > SNAPSHOT_DELTA_RATIO * document_bytes
+            or chain_length > MAX_DELTA_CHAIN)
+
+def compute_delta(old: Dict, new: Dict) -> Dict:
+    """
+    Compute a field-level delta that turns ``old`` into ``new``.
+
+    Scalar fields are recorded whole. Coordinates are diffed point by point,
+    so editing one corner of a boundary only stores the fields that changed
+    on that point.
+
+    Args:
+        old: Certificate content before the change
+        new: Certificate content after the change
+
+    Returns:
+        Dictionary with optional ``set``, ``unset`` and ``coordinates`` keys;
+        empty if the two documents are identical
+    """
+    delta = {}
+
+    set_fields = {}
+    for key, value in new.items():
+        if key == "coordinates":
+            continue
+        if key not in old or old[key] != value:
+            set_fields[key] = copy.deepcopy(value)
+    if set_fields:
+        delta["set"] = set_fields
+
+    unset_fields = [key for key in old if key not in new]
+    if unset_fields:
+        delta["unset"] = unset_fields
+
+    old_coords = old.get("coordinates") or []
+    new_coords = new.get("coordinates") or []
+    changes = []
+    for i, point in enumerate(new_coords):
+        if i >= len(old_coords):
+            changes.append([i, copy.deepcopy(point)])
+            continue
+        changed = {
+            field: value
+            for field, value in point.items()
+            if old_coords[i].get(field) != value
+        }
+        if changed:
+            changes.append([i, changed])
+    # A removed coordinates field is already covered by "unset"
+    if "coordinates" in new and (changes or len(old_coords) != len(new_coords)
+                                 or "coordinates" not in old):
+        delta["coordinates"] = {"length": len(new_coords), "changes": changes}
+
+    return delta
+
+def apply_delta(document: Dict, delta: Dict) -> Dict:
+    """
+    Apply a delta produced by ``compute_delta`` to a document.
+
+    Args:
+        document: Certificate content to start from
+        delta: Delta to apply
+
+    Returns:
+        New dictionary with the delta applied; the input is not modified
+    """
+    result = copy.deepcopy(document)
+
+    for key, value in delta.get("set", {}).items():
+        result[key] = copy.deepcopy(value)
+    for key in delta.get("unset", []):
+        result.pop(key, None)
+
+    coord_delta = delta.get("coordinates")
+    if coord_delta is not None:
+        coords = result.get("coordinates") or []
+        coords = coords[:coord_delta["length"]]
+        while len(coords) < coord_delta["length"]:
+            coords.append({})
+        for index, changed in coord_delta["changes"]:
+            coords[index] = {**coords[index], **copy.deepcopy(changed)}
+        result["coordinates"] = coords
+
+    return result
+
+def _changed_fields(delta: Dict) -> List[str]:
+    """List the top-level fields touched by a delta."""
+    fields = list(delta.get("set", {})) + list(delta.get("unset", []))
+    if "coordinates" in delta:
+        fields.append("coordinates")
+    return sorted(fields)
+
+async def _insert_revision(db, certificate_id: ObjectId, version: int,
+                           previous: Optional[Dict], current: Dict,
+                           created_at: datetime, session=None) -> Dict:
+    revision = {
+        "certificate_id": certificate_id,
+        "version": version,
+        "created_at": created_at,
+    }
+
+    # Running totals since the last snapshot are kept on each revision, so
+    # deciding whether to snapshot only needs the preceding one
+    predecessor = None
+    if previous is not None:
+        predecessor = await db[REVISIONS_COLLECTION].find_one(
+            {"certificate_id": certificate_id, "version": version - 1},
+            projection={"delta_bytes": 1, "chain_length": 1},
+            session=session
+        )
+
+    # Revisions written before running totals existed start a new chain
+    has_totals = predecessor is not None and "delta_bytes" in predecessor
+    delta = compute_delta(previous, current) if has_totals else None
+    if delta is not None:
+        delta_bytes = predecessor["delta_bytes"] + _encoded_size(delta)
+        chain_length = predecessor["chain_length"] + 1
+    if delta is None or needs_snapshot(delta_bytes, chain_length, _encoded_size(current)):
+        revision["kind"] = "snapshot"
+        revision["data"] = current
+        revision["fields"] = sorted(current)
+        revision["delta_bytes"] = 0
+        revision["chain_length"] = 0
+    else:
+        revision["kind"] = "delta"
+        revision["delta"] = delta
+        revision["fields"] = _changed_fields(delta)
+        revision["delta_bytes"] = delta_bytes
+        revision["chain_length"] = chain_length
+
+    await db[REVISIONS_COLLECTION].insert_one(revision, session=session)
+    logger.info(f"Stored {revision['kind']} revision {version} for certificate {certificate_id}")
+    return revision
+
+async def ensure_revision_baseline(db, certificate_id: ObjectId, created_at: datetime, session=None):
+    """
+    Start the revision history of a certificate that predates revisions.
+
+    The stored state becomes version 1 and the certificate's ``revision``
+    counter is set to 1 in one atomic update, so only one concurrent writer
+    records the baseline and later updates version from it.
+
+    Args:
+        db: Database handle
+        certificate_id: ID of the certificate
+        created_at: Fallback timestamp if the certificate has no updated_at
+        session: Session of the transaction the baseline belongs to
+    """
+    baseline = await db.certificates.find_one_and_update(
+        {"_id": certificate_id, "revision": {"$exists": False}},
+        {"$set": {"revision": 1}},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if baseline is None:
+        return
+    await _insert_revision(db, certificate_id, 1, None, _tracked_fields(baseline),
+                           baseline.get("updated_at", created_at), session=session)
+
+async def record_revision(db, certificate_id: ObjectId, version: int, previous: Optional[Dict],
+                          current: Dict, created_at: datetime, session=None) -> int:
+    """
+    Record a revision of a certificate.
+
+    ``version`` and ``previous`` must come from the same atomic update that
+    wrote ``current`` (the incremented ``revision`` counter and the document
+    returned with ReturnDocument.BEFORE), so concurrent writers always store
+    the delta against their exact predecessor. Pass the session of that
+    update's transaction so the revision commits together with it.
+
+    Args:
+        db: Database handle
+        certificate_id: ID of the certificate
+        version: Version number allocated by the update
+        previous: Stored certificate before the change, or None on creation
+        current: Stored certificate after the change
+        created_at: Timestamp of the revision
+        session: Session of the transaction that wrote ``current``
+
+    Returns:
+        The version number recorded
+    """
+    previous_data = _tracked_fields(previous) if previous is not None else None
+    await _insert_revision(db, certificate_id, version, previous_data,
+                           _tracked_fields(current), created_at, session=session)
+    return version
+
+async def list_revisions(db, certificate_id: ObjectId) -> List[Dict]:
+    """
+    List the revisions of a certificate without their payloads.
+
+    Returns:
+        List of dictionaries with version, kind, created_at and changed fields,
+        oldest first
+    """
+    cursor = db[REVISIONS_COLLECTION].find(
+        {"certificate_id": certificate_id},
+        projection={"_id": 0, "version": 1, "kind": 1, "created_at": 1, "fields": 1}
+    ).sort("version", 1)
+    return await cursor.to_list(length=None)
+
+async def get_revision(db, certificate_id: ObjectId, version: int) -> Dict:
+    """
+    Rebuild a certificate as it was at the given version.
+
+    Reads the latest snapshot at or below ``version`` and replays the deltas
+    after it. Snapshot placement bounds those deltas to about
+    SNAPSHOT_DELTA_RATIO document sizes and at most MAX_DELTA_CHAIN entries.
+
+    Raises:
+        RevisionNotFoundError: If the version does not exist
+    """
+    if version < 1:
+        raise RevisionNotFoundError(f"Revision {version} not found")
+
+    snapshot = await db[REVISIONS_COLLECTION].find_one(
+        {"certificate_id": certificate_id, "kind": "snapshot", "version": {"$lte": version}},
+        sort=[("version", -1)]
+    )
+    if snapshot is None:
+        raise RevisionNotFoundError(f"Revision {version} not found")
+    revisions = [snapshot] + await db[REVISIONS_COLLECTION].find({
+        "certificate_id": certificate_id,
+        "version": {"$gt": snapshot["version"], "$lte": version}
+    }).sort("version", 1).to_list(length=None)
+
+    versions = [revision["version"] for revision in revisions]
+    if versions != list(range(snapshot["version"], version + 1)):
+        if versions[-1] < version and not await db[REVISIONS_COLLECTION].count_documents(
+                {"certificate_id": certificate_id, "version": {"$gt": version}}, limit=1):
+            raise RevisionNotFoundError(f"Revision {version} not found")
+        # Only possible for histories written before revisions were transactional
+        raise RevisionNotFoundError(f"Revision history for version {version} is incomplete")
+
+    document = copy.deepcopy(snapshot["data"])
+    for revision in revisions[1:]:
+        document = apply_delta(document, revision["delta"])
+
+    return {
+        "certificate_id": str(certificate_id),
+        "version": version,
+        "revision_created_at": revisions[-1]["created_at"],
+        **document
+    }
+
+async def diff_revisions(db, certificate_id: ObjectId, from_version: int, to_version: int) -> Dict:
+    """
+    Compute the delta between two versions of a certificate.
+
+    Raises:
+        RevisionNotFoundError: If either version does not exist
+    """
+    old = await get_revision(db, certificate_id, from_version)
+    new = await get_revision(db, certificate_id, to_version)
+    metadata = ("certificate_id", "version", "revision_created_at")
+    old_data = {k: v for k, v in old.items() if k not in metadata}
+    new_data = {k: v for k, v in new.items() if k not in metadata}
+    return {
+        "certificate_id": str(certificate_id),
+        "from_version": from_version,
+        "to_version": to_version,
+        "delta": compute_delta(old_data, new_data)
+    }
+
+async def delete_revisions(db, certificate_id: ObjectId, session=None) -> int:
+    """Remove all revisions of a certificate. Returns the number deleted."""
+    result = await db[REVISIONS_COLLECTION].delete_many(
+        {"certificate_id": certificate_id}, session=session
+    )
+    return result.deleted_count
@@ -1,32 +1,114 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Table, Button, message, Space, Popconfirm } from 'antd';
 import { EyeOutlined, EditOutlined, DeleteOutlined } from '@ant-design/icons';
 import axios from 'axios';
 
+// Apply a single create/update/delete event pushed by the server to the list
+const applyCertificateEvent = (certificates, event) => {
+  switch (event.type) {
+    case 'created':
+      if (certificates.some((cert) => cert._id === event.certificate_id)) {
+        return certificates;
+      }
+      return [event.certificate, ...certificates];
+    case 'updated':
+      return certificates.map((cert) =>
+        cert._id === event.certificate_id ? event.certificate : cert
+      );
+    case 'deleted':
+      return certificates.filter((cert) => cert._id !== event.certificate_id);
+    default:
+      return certificates;
+  }
+};
+
 const CertificateHistory = ({ onEditCertificate }) => {
   const [certificates, setCertificates] = useState([]);
   const [loading, setLoading] = useState(false);
 
+  // Events received while a list fetch is in flight, replayed onto its result
+  const pendingEventsRef = useRef(null);
+  const fetchIdRef = useRef(0);
+  // "handlers" means the server only pushes writes handled by the worker we
+  // are connected to; "change_stream" means it pushes every write
+  const eventSourceKindRef = useRef('handlers');
+
+  const applyEvent = (event) => {
+    if (pendingEventsRef.current) {
+      pendingEventsRef.current.push(event);
+    } else {
+      setCertificates((prev) => applyCertificateEvent(prev, event));
+    }
+  };
+
   const fetchCertificates = async () => {
+    const fetchId = ++fetchIdRef.current;
+    if (!pendingEventsRef.current) {
+      pendingEventsRef.current = [];
+    }
     try {
       setLoading(true);
       const response = await axios.get('http://localhost:5000/api/certificates');
+      if (fetchId !== fetchIdRef.current) {
+        return; // A newer fetch replaced this one
+      }
       console.log('Fetched certificates:', response.data);
-      setCertificates(response.data);
+      const pending = pendingEventsRef.current || [];
+      pendingEventsRef.current = null;
+      setCertificates(pending.reduce(applyCertificateEvent, response.data));
     } catch (error) {
+      if (fetchId === fetchIdRef.current) {
+        const pending = pendingEventsRef.current || [];
+        pendingEventsRef.current = null;
+        setCertificates((prev) => pending.reduce(applyCertificateEvent, prev));
+      }
       console.error('Error fetching certificates:', error);
       message.error('Failed to fetch certificates');
     } finally {
-      setLoading(false);
+      if (fetchId === fetchIdRef.current) {
+        setLoading(false);
+      }
     }
   };
 
   useEffect(() => {
-    fetchCertificates();
+    // Subscribe to live certificate events instead of refetching the list.
+    // EventSource reconnects on its own and resumes from the last event id.
+    // The list is fetched once the server confirms the subscription, and
+    // events arriving meanwhile are buffered, so none are lost or overwritten.
+    let synced = false;
+    const eventSource = new EventSource('http://localhost:5000/api/certificates/events');
+    const handleCertificateEvent = (e) => applyEvent(JSON.parse(e.data));
+    ['created', 'updated', 'deleted'].forEach((type) =>
+      eventSource.addEventListener(type, handleCertificateEvent)
+    );
+    eventSource.addEventListener('ready', (e) => {
+      eventSourceKindRef.current = JSON.parse(e.data).source;
+      if (!synced) {
+        synced = true;
+        fetchCertificates();
+      }
+    });
+    // The server could not replay the missed events, so start over
+    eventSource.addEventListener('reset', (e) => {
+      eventSourceKindRef.current = JSON.parse(e.data).source;
+      synced = true;
+      fetchCertificates();
+    });
+    // Still show the list if the event stream is unavailable
+    eventSource.onerror = () => {
+      if (!synced) {
+        synced = true;
+        fetchCertificates();
+      }
+    };
 
-    // Add refresh event listener
+    // Add refresh event listener. Events only cover every worker when the
+    // server reads them from the change stream, otherwise refetch as before.
     const handleRefresh = () => {
-      fetchCertificates();
+      if (eventSourceKindRef.current !== 'change_stream' || eventSource.readyState !== EventSource.OPEN) {
+        fetchCertificates();
+      }
     };
 
     const historyComponent = document.querySelector('[data-testid="certificate-history"]');
@@ -36,6 +118,7 @@ const CertificateHistory = ({ onEditCertificate }) => {
 
     // Cleanup
     return () => {
+      eventSource.close();
       if (historyComponent) {
         historyComponent.removeEventListener('refresh', handleRefresh);
       }
@@ -70,7 +153,7 @@ const CertificateHistory = ({ onEditCertificate }) => {
     try {
       await axios.delete(`http://localhost:5000/api/certificates/${id}`);
       message.success('Certificate deleted successfully');
-      fetchCertificates(); // Refresh the list
+      applyEvent({ type: 'deleted', certificate_id: id });
     } catch (error) {
       console.error('Error deleting certificate:', error);
       message.error('Failed to delete certificate');